@@ -13,8 +13,11 @@ const retryWithExponentialBackoff = async (
     try {
       return await func();
     } catch (error: any) {
-      if (error.status === 503 && i < retries - 1) {
-        console.warn(`[503 Service Unavailable] Retrying in ${delay}ms...`);
+      if (
+        (error.status === 503 || error.status === 429) &&
+        i < retries - 1
+      ) {
+        console.warn(`[${error.status}] Retrying in ${delay}ms...`);
         await new Promise((resolve) => setTimeout(resolve, delay));
         delay *= 2;
       } else {
@@ -35,10 +38,8 @@ export const chatMessage = async (req: Request, res: Response) => {
 
   try {
     const llm = new LLM();
-    const response = await llm.processUserInput(
-      message,
-      sessionId,
-      screenplayType
+    const response = await retryWithExponentialBackoff(() =>
+      llm.processUserInput(message, sessionId, screenplayType)
     );
 
     // Parse the JSON response and extract the result
@@ -70,30 +71,33 @@ export const chatMessage = async (req: Request, res: Response) => {
         .json({ message: "AI model generated an empty response" });
     }
 
-    // Find or create session
-    let session = await ChatSession.findOne({ sessionId });
-    if (!session) {
-      // Create new session with userId (email)
-      session = new ChatSession({
-        sessionId,
-        userId: email,
-        sessionTitle: sessionTitle || "New Chat",
-        messages: [
-          { role: "user", content: message.trim(), timestamp: new Date() },
-          { role: "assistant", content: assistantReply, timestamp: new Date() },
-        ],
-      });
-    } else {
-      // Add to existing session
-      session.messages.push(
-        { role: "user", content: message.trim(), timestamp: new Date() },
-        { role: "assistant", content: assistantReply, timestamp: new Date() }
-      );
-    }
-
-    // Validate the session before saving
+    // Append the exchange atomically, creating the session on first use.
+    // A load-modify-save cycle rewrites the entire messages array on every
+    // turn, so long sessions pay O(N) write bytes per message; $push only
+    // sends the two new messages.
     try {
-      await session.save();
+      await ChatSession.updateOne(
+        { sessionId },
+        {
+          $push: {
+            messages: {
+              $each: [
+                { role: "user", content: message.trim(), timestamp: new Date() },
+                {
+                  role: "assistant",
+                  content: assistantReply,
+                  timestamp: new Date(),
+                },
+              ],
+            },
+          },
+          $setOnInsert: {
+            userId: email,
+            sessionTitle: sessionTitle || "New Chat",
+          },
+        },
+        { upsert: true }
+      );
     } catch (saveError) {
       console.error("Failed to save chat session:", saveError);
       return res.status(500).json({ message: "Failed to save chat session" });
@@ -108,6 +112,108 @@ export const chatMessage = async (req: Request, res: Response) => {
   }
 };
 
+export const chatBatch = async (req: Request, res: Response) => {
+  const { messages, sessionId, email, screenplayType } = req.body;
+
+  if (
+    !Array.isArray(messages) ||
+    messages.length === 0 ||
+    !sessionId ||
+    !email
+  ) {
+    return res.status(400).json({
+      message: "messages (non-empty array), sessionId, and email are required",
+    });
+  }
+
+  try {
+    const llm = new LLM();
+    const results = await llm.processBatch(messages, sessionId, screenplayType);
+    res.json({ sessionId, results });
+  } catch (error) {
+    console.error("Error processing batch:", error);
+    res.status(500).json({ message: "Failed to process batch." });
+  }
+};
+
+export const chatMessageStream = async (req: Request, res: Response) => {
+  const { message, sessionId, email, sessionTitle } = req.body;
+
+  if (!message || !sessionId || !email) {
+    return res
+      .status(400)
+      .json({ message: "Message, sessionId, and email are required" });
+  }
+
+  try {
+    const llm = new LLM();
+
+    // Only conversational replies are free text; feature processing emits
+    // structured JSON and should go through the regular /message endpoint.
+    const classificationResult = await llm.classifyInput(message);
+    if (classificationResult.classification !== "General Conversation") {
+      return res.status(400).json({
+        message:
+          "Streaming is only available for conversational messages; use /message instead",
+      });
+    }
+
+    res.setHeader("Content-Type", "text/event-stream");
+    res.setHeader("Cache-Control", "no-cache");
+    res.setHeader("Connection", "keep-alive");
+    res.flushHeaders();
+
+    let assistantReply = "";
+    for await (const token of llm.streamConversation(sessionId, message)) {
+      assistantReply += token;
+      res.write(`data: ${JSON.stringify({ token })}\n\n`);
+    }
+
+    // Persist the exchange the same way the non-streaming endpoint does
+    try {
+      await ChatSession.updateOne(
+        { sessionId },
+        {
+          $push: {
+            messages: {
+              $each: [
+                { role: "user", content: message.trim(), timestamp: new Date() },
+                {
+                  role: "assistant",
+                  content: assistantReply,
+                  timestamp: new Date(),
+                },
+              ],
+            },
+          },
+          $setOnInsert: {
+            userId: email,
+            sessionTitle: sessionTitle || "New Chat",
+          },
+        },
+        { upsert: true }
+      );
+    } catch (saveError) {
+      console.error("Failed to save chat session:", saveError);
+    }
+
+    res.write(`data: ${JSON.stringify({ done: true, sessionId })}\n\n`);
+    res.end();
+  } catch (error) {
+    console.error("Error streaming content:", error);
+    if (res.headersSent) {
+      res.write(
+        `data: ${JSON.stringify({ error: "Failed to generate a response." })}\n\n`
+      );
+      res.end();
+    } else {
+      res
+        .status(500)
+        .json({ message: "Failed to generate a structured response." });
+    }
+  }
+};
+
 export const getSessionsByEmail = async (req: Request, res: Response) => {
   const { email } = req.params;
   if (!email) {
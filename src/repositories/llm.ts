@@ -1,4 +1,5 @@
 // src/LLM.ts
+import { createHash } from "crypto";
 import dotenv from "dotenv";
 import winston from "winston";
 import { ChatGoogleGenerativeAI } from "@langchain/google-genai";
@@ -8,6 +9,249 @@ import { HumanMessage, AIMessage } from "@langchain/core/messages";
 
 dotenv.config();
 
+// Single Gemini client for the whole process: constructing a fresh
+// ChatGoogleGenerativeAI per call rebuilds the underlying HTTP client and
+// auth state, while a shared instance lets the transport reuse pooled
+// connections. Created lazily so the API key is read after dotenv loads.
+let sharedModel: ChatGoogleGenerativeAI | null = null;
+let sharedJsonModel: ChatGoogleGenerativeAI | null = null;
+
+// Classification outputs are tiny and highly repetitive — greetings and
+// re-sent feature descriptions dominate traffic and always map to the same
+// one-of-two label — so cache them across requests. The cache lives at
+// module scope because a fresh LLM instance is constructed per request.
+const CLASSIFICATION_CACHE_MAX = 512;
+const classificationCache = new Map<string, string>();
+
+// Exact-match short-circuit for the most common conversational inputs;
+// these never need a model call at all.
+const GREETING_INPUTS = new Set([
+  "hi",
+  "hello",
+  "hey",
+  "yo",
+  "bye",
+  "goodbye",
+  "thanks",
+  "thank you",
+  "ok",
+  "okay",
+  "good morning",
+  "good afternoon",
+  "good evening",
+  "good night",
+  "how are you",
+]);
+
+// Feature analysis and tech-layer output depend only on their input text,
+// and iterative sessions re-send the same descriptions, so cache results by
+// content hash: repeats skip the Gemini round-trip entirely. Entries expire
+// after a day and the cache is size-capped with oldest-first eviction.
+const AGENT_CACHE_MAX = 256;
+const AGENT_CACHE_TTL_MS = 24 * 60 * 60 * 1000;
+const agentCache = new Map<string, { expiresAt: number; value: any }>();
+
+function contentKey(agent: string, text: string): string {
+  return `${agent}:${createHash("sha256").update(text).digest("hex")}`;
+}
+
+function agentCacheGet(key: string): any | null {
+  const entry = agentCache.get(key);
+  if (!entry) {
+    return null;
+  }
+  if (entry.expiresAt < Date.now()) {
+    agentCache.delete(key);
+    return null;
+  }
+  return entry.value;
+}
+
+function agentCacheSet(key: string, value: any): void {
+  if (agentCache.size >= AGENT_CACHE_MAX) {
+    const oldest = agentCache.keys().next().value;
+    if (oldest !== undefined) agentCache.delete(oldest);
+  }
+  agentCache.set(key, { expiresAt: Date.now() + AGENT_CACHE_TTL_MS, value });
+}
+
+// Patterns for the post-LLM JSON extraction hot path, built once at module
+// load instead of on every cleanText call.
+const JSON_FENCE_RE = /```json\s*([\s\S]*?)\s*```/;
+const FENCE_MARKER_RE = /```json|```/g;
+const JSON_OBJ_RE = /\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}/g;
+const CONTROL_CHARS_RE = /[\x00-\x1F\x7F]/g;
+// One substitution pass for the escape sequences cleanText used to handle
+// with five chained .replace calls, each of which rescanned and
+// reallocated the whole string.
+const UNESCAPE_RE = /\\[nt"'\\]/g;
+const UNESCAPE_MAP: Record<string, string> = {
+  "\\n": " ",
+  "\\t": " ",
+  '\\"': '"',
+  "\\\\": "\\",
+  "\\'": "'",
+};
+const MULTI_SPACE_RE = /\s+/g;
+const TRAILING_COMMA_RE = /,(\s*[}\]])/g;
+
+// Prompt templates are static, so build them once at module load instead of
+// reconstructing (and re-validating) a PromptTemplate per request. They are
+// kept deliberately terse: every token here is re-sent on each request and
+// inflates prefill latency and cost, and JSON mode already constrains the
+// output format.
+const CLASSIFY_PROMPT = new PromptTemplate({
+  inputVariables: ["user_input"],
+  template: `Classify the user input as exactly one of "General Conversation" (greetings, small talk, anything unrelated to video feature creation) or "Feature Description" (environments, characters, story ideas, creative directions, or other material intended for video creation).
+
+Return strict JSON with exactly one key, e.g. {{"classification": "General Conversation"}}.
+
+User input:
+{user_input}
+`,
+});
+
+const ANALYZE_PROMPT = new PromptTemplate({
+  inputVariables: ["description"],
+  template: `Analyze the feature description below in two phases.
+Concept analysis: extract core value propositions, pain points addressed, key stakeholders, and main use cases.
+Narrative design: propose story arcs, emotional beats and transitions, and visual/audio synchronization ideas for presentations or videos.
+
+Input:
+{description}
+
+Return strict JSON matching:
+{{
+  "concept_analysis": {{"core_value_propositions": [], "pain_points": [], "stakeholders": [], "use_cases": []}},
+  "narrative_design": {{"story_arcs": [], "emotional_beats": [], "visual_audio_sync": []}}
+}}
+`,
+});
+
+const TECH_LAYER_PROMPT = new PromptTemplate({
+  inputVariables: ["user_prompt"],
+  template: `You are an AI Video Story Architect. From the user request below, generate exactly 8 cinematic video chunks of 8 seconds each, forming one continuous story with a linear screenplay.
+
+Requirements:
+- Follow the SAME main characters across all 8 chunks, with continuity in appearance, voice, gestures, and personality, evolving emotionally through the story.
+- Build a narrative arc (beginning, development, climax, resolution); each chunk feels self-contained but connects clearly to the next.
+- Ground scenes in authentic human activities with realistic interactions, props, and environmental storytelling; no talking heads, no text overlays.
+- Optimize for VEO3: consistent lighting across chunks, smooth audio transitions (ambient sounds, natural dialogue, music cues), varied cinematic camera work (wide, close-up, tracking), and visual continuity of clothing, props, weather, and setting.
+
+Return ONLY JSON in this format:
+{{
+  "chunk1": {{"heading": "", "environment": "", "characters": [], "activity": "", "camera_direction": "", "audio_visual_sync": ""}},
+  ...
+  "chunk8": {{"heading": "", "environment": "", "characters": [], "activity": "", "camera_direction": "", "audio_visual_sync": ""}}
+}}
+
+User request: {user_prompt}
+`,
+});
+
+// Fused Feature-Analysis + Tech-Layer prompt: the two agents always ran
+// back-to-back on the feature path, so one combined call halves the
+// round-trips and sends the instructions once.
+const ANALYZE_AND_TECH_PROMPT = new PromptTemplate({
+  inputVariables: ["description"],
+  template: `You will analyze a video feature description and design its cinematic treatment in one pass.
+
+Task 1 — feature_analysis: concept analysis (core value propositions, pain points addressed, key stakeholders, main use cases) and narrative design (story arcs, emotional beats and transitions, visual/audio synchronization ideas).
+
+Task 2 — tech_layer: from the same description, generate exactly 8 cinematic video chunks of 8 seconds each, forming one continuous story with a linear screenplay. Follow the SAME main characters across all 8 chunks with continuity in appearance, voice, gestures, and personality; build a narrative arc (beginning, development, climax, resolution); ground scenes in authentic human activities with realistic props, no talking heads, no text overlays; optimize for VEO3 with consistent lighting, smooth audio transitions, varied cinematic camera work, and visual continuity of clothing, props, weather, and setting.
+
+Input:
+{description}
+
+Return strict JSON matching:
+{{
+  "feature_analysis": {{
+    "concept_analysis": {{"core_value_propositions": [], "pain_points": [], "stakeholders": [], "use_cases": []}},
+    "narrative_design": {{"story_arcs": [], "emotional_beats": [], "visual_audio_sync": []}}
+  }},
+  "tech_layer": {{
+    "chunk1": {{"heading": "", "environment": "", "characters": [], "activity": "", "camera_direction": "", "audio_visual_sync": ""}},
+    ...
+    "chunk8": {{"heading": "", "environment": "", "characters": [], "activity": "", "camera_direction": "", "audio_visual_sync": ""}}
+  }}
+}}
+`,
+});
+
+const SCREENPLAY_PROMPT = new PromptTemplate({
+  inputVariables: ["chunks"],
+  template: `You are a professional screenplay writer and cinematic scene designer. Transform the 8 structured chunks below (chunk1 to chunk8) into a screenplay of 8 fully written scenes (Scene 1 to Scene 8), one scene per chunk, ready for VEO3 video generation.
+
+For each scene, expand (never summarize) the chunk into: a scene heading (location, time, mood), rich environment description, character presence and actions in natural screenplay narrative, emotional tone matching the progression across scenes, camera direction in film language (establishing shots, pans, close-ups, tracking shots, crane shots), and integrated audio/visual cues (ambient sounds, music cues, emotional resonance).
+
+Keep strict continuity across all 8 scenes: the same characters and environment throughout, and for every character the same attire color, skin tone, hair style and color, facial features, body type and height, voice and speech patterns, and personality. State who is present and their appearance in each scene.
+
+Return ONLY JSON in this format:
+{{
+  "scenes": [
+    {{"scene_number": 1, "content": "..."}},
+    {{"scene_number": 2, "content": "..."}},
+    {{"scene_number": 8, "content": "..."}}
+  ]
+}}
+
+Chunks:
+{chunks}
+`,
+});
+
+/** Normalize user input so trivially different phrasings share a cache key */
+function normalizeInput(userInput: string): string {
+  return userInput
+    .trim()
+    .toLowerCase()
+    .replace(/\s+/g, " ")
+    .replace(/[.!?,]+$/, "");
+}
+
+/**
+ * Extract plain text from a model response's content. Content is usually a
+ * string, but Gemini can return an array of parts, and calling toString on
+ * that mangles it into "[object Object],..." — join the text parts instead.
+ */
+function messageText(content: unknown): string {
+  if (typeof content === "string") {
+    return content;
+  }
+  if (Array.isArray(content)) {
+    return content
+      .map((part: any) => (typeof part === "string" ? part : part?.text ?? ""))
+      .join("");
+  }
+  return content == null ? "" : String(content);
+}
+
+// Vocabulary that marks an input as a video feature description.
+const FEATURE_KEYWORD_RE =
+  /\b(video|scene|scenes|character|characters|story|storyline|screenplay|cinematic|film|movie|camera|shot|shots|narrative)\b/i;
+
+// Inputs shorter than this without any feature vocabulary are small talk.
+const SHORT_INPUT_THRESHOLD = 15;
+
+/**
+ * Cheap heuristic classifier run before any model call. Returns a label for
+ * obvious inputs and null when the input is ambiguous enough to need Gemini.
+ */
+function fastClassify(userInput: string): string | null {
+  const normalized = normalizeInput(userInput);
+
+  if (GREETING_INPUTS.has(normalized)) {
+    return "General Conversation";
+  }
+  if (FEATURE_KEYWORD_RE.test(normalized)) {
+    return "Feature Description";
+  }
+  if (normalized.length < SHORT_INPUT_THRESHOLD) {
+    return "General Conversation";
+  }
+  return null;
+}
+
 export class LLM {
   private GEMINI_API_KEY: string;
   private logger: winston.Logger;
@@ -20,7 +264,9 @@ export class LLM {
   /** Setup logger */
   private getLogger(name: string): winston.Logger {
     return winston.createLogger({
-      level: "debug",
+      // Default to info so per-call model output isn't formatted and
+      // written unless debug logging is explicitly requested.
+      level: process.env.LOG_LEVEL || "info",
       format: winston.format.combine(
         winston.format.timestamp(),
         winston.format.printf(({ timestamp, level, message }) => {
@@ -36,14 +282,14 @@ export class LLM {
     if (!text) return "";
 
     // First, try to extract JSON from markdown code blocks
-    const jsonMatch = text.match(/```json\s*([\s\S]*?)\s*```/);
+    const jsonMatch = text.match(JSON_FENCE_RE);
     if (jsonMatch) {
       text = jsonMatch[1]!;
     } else {
       // Remove markdown formatting
-      text = text.replace(/```json|```/g, "");
+      text = text.replace(FENCE_MARKER_RE, "");
       // Try to find JSON object - look for the largest JSON object
-      const jsonMatches = text.match(/\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}/g);
+      const jsonMatches = text.match(JSON_OBJ_RE);
       if (jsonMatches && jsonMatches.length > 0) {
         // Find the largest JSON object (most likely the main response)
         text = jsonMatches.reduce((largest, current) =>
@@ -57,20 +303,16 @@ export class LLM {
     // Clean up the text more thoroughly
     text = text
       .trim()
-      // Handle escaped characters
-      .replace(/\\n/g, " ")
-      .replace(/\\t/g, " ")
-      .replace(/\\"/g, '"')
-      .replace(/\\\\/g, "\\")
-      .replace(/\\'/g, "'")
+      // Handle escaped characters in a single pass
+      .replace(UNESCAPE_RE, (m) => UNESCAPE_MAP[m] ?? m)
       // Remove actual control characters that could break JSON
-      .replace(/[\x00-\x1F\x7F]/g, " ")
+      .replace(CONTROL_CHARS_RE, " ")
       // Replace multiple spaces with single space
-      .replace(/\s+/g, " ")
+      .replace(MULTI_SPACE_RE, " ")
       // Ensure proper quote handling
       .replace(/([^\\])"/g, '$1"')
       // Remove any trailing commas before closing braces/brackets
-      .replace(/,(\s*[}\]])/g, "$1");
+      .replace(TRAILING_COMMA_RE, "$1");
 
     return text;
   }
@@ -166,316 +408,226 @@ export class LLM {
     }
   }
 
-  /** Initialize Gemini model */
+  /** Initialize Gemini model (shared across calls and LLM instances) */
   private getModel() {
-    return new ChatGoogleGenerativeAI({
-      model: "gemini-2.5-pro",
-      temperature: 0.2,
-      apiKey: this.GEMINI_API_KEY,
-    });
+    if (!sharedModel) {
+      sharedModel = new ChatGoogleGenerativeAI({
+        model: "gemini-2.5-pro",
+        temperature: 0.2,
+        apiKey: this.GEMINI_API_KEY,
+      });
+    }
+    return sharedModel;
   }
 
-  /** Classification Agent */
-  public async classifyInput(userInput: string) {
-    const template = new PromptTemplate({
-      inputVariables: ["user_input"],
-      template: `
-You are an AI Input Classifier.  
-
-Your ONLY job is to read the user input and classify it into **exactly one** of the following categories:  
-
-1. "General Conversation"  
-   - Greetings ("hi", "hello", "bye", etc.)  
-   - Small talk or chit-chat  
-   - Questions or dialogue unrelated to video feature creation  
-
-2. "Feature Description"  
-   - Any input that provides descriptions intended for **video creation**  
-   - Inputs describing environments, characters, story ideas, creative directions, or cinematic elements  
-
-### Critical Instructions:
-- You MUST return output in **strict JSON format only**.  
-- The JSON must have exactly one key: "classification".  
-- The value must be **either** "General Conversation" **or** "Feature Description".  
-- No explanations, no extra text, no variations in casing, no additional keys.  
-- Do not invent categories. Do not output anything outside the two allowed values.  
-
-### JSON Output Format:
-{{
-  "classification": "General Conversation"
-}}
+  /**
+   * Gemini model in JSON mode (response_mime_type: application/json) for the
+   * structured agents. The model returns raw parseable JSON without markdown
+   * fences, so responses are smaller and usually skip cleanText entirely.
+   * Kept separate from getModel so free-text conversation is unaffected.
+   */
+  private getJsonModel() {
+    if (!sharedJsonModel) {
+      sharedJsonModel = new ChatGoogleGenerativeAI({
+        model: "gemini-2.5-pro",
+        temperature: 0.2,
+        apiKey: this.GEMINI_API_KEY,
+        json: true,
+      });
+    }
+    return sharedJsonModel;
+  }
 
-OR
+  /**
+   * Parse a model response that should already be JSON (JSON mode). Falls
+   * back through fence stripping (cleanText) and then the common-issue
+   * fixer (tryFixJSON) for malformed output; returns null when every
+   * attempt fails. All agents share this one fallback ladder, so parsing
+   * fixes land in a single place.
+   */
+  private parseJsonResponse(rawText: string): any | null {
+    // Guarded and truncated: responses can be multi-KB and debug is off by
+    // default, so skip the string formatting entirely when disabled.
+    if (this.logger.isLevelEnabled("debug")) {
+      this.logger.debug(`Raw model output: ${rawText.slice(0, 500)}`);
+    }
 
-{{
-  "classification": "Feature Description"
-}}
+    try {
+      return JSON.parse(rawText);
+    } catch (err) {
+      // fall through to the cleanup ladder
+    }
 
-### User Input to Classify:
-{user_input}
+    const cleaned = this.cleanText(rawText);
+    try {
+      return JSON.parse(cleaned);
+    } catch (err) {
+      // one more rung: repair common JSON issues
+    }
 
-`,
-    });
+    try {
+      return JSON.parse(this.tryFixJSON(cleaned));
+    } catch (err) {
+      return null;
+    }
+  }
 
-    const prompt = await template.format({ user_input: userInput });
-    const model = this.getModel();
+  /** Classification Agent */
+  public async classifyInput(userInput: string) {
+    const fastLabel = fastClassify(userInput);
+    if (fastLabel) {
+      return { classification: fastLabel };
+    }
+
+    const normalized = normalizeInput(userInput);
+    const cached = classificationCache.get(normalized);
+    if (cached) {
+      return { classification: cached };
+    }
+
+    const prompt = await CLASSIFY_PROMPT.format({ user_input: userInput });
+    const model = this.getJsonModel();
     const rawOutput = await model.invoke(prompt);
 
-    const cleaned = this.cleanText(rawOutput.content?.toString() || "");
+    const rawText = messageText(rawOutput.content);
+    const parsed = this.parseJsonResponse(rawText);
+    if (parsed === null) {
+      return { raw_output: rawText, error: "Failed to parse JSON" };
+    }
 
-    try {
-      return JSON.parse(cleaned);
-    } catch (err) {
-      return { raw_output: cleaned, error: "Failed to parse JSON" };
+    if (
+      parsed.classification === "General Conversation" ||
+      parsed.classification === "Feature Description"
+    ) {
+      // Evict the oldest entry once full so the cache stays bounded
+      if (classificationCache.size >= CLASSIFICATION_CACHE_MAX) {
+        const oldest = classificationCache.keys().next().value;
+        if (oldest !== undefined) classificationCache.delete(oldest);
+      }
+      classificationCache.set(normalized, parsed.classification);
     }
+    return parsed;
   }
 
   /** Feature Analysis Agent */
   public async analyzeFeature(description: string) {
-    const template = new PromptTemplate({
-      inputVariables: ["description"],
-      template: `
-You are an AI Feature Analysis Assistant.  
-Your task is to analyze the provided feature description and documentation, then produce a structured JSON output.  
-
-Follow these two phases:
-
-### Phase 1: Concept Analysis
-- Parse feature descriptions and technical documentation  
-- Extract **core value propositions**  
-- Extract **pain points addressed**  
-- Identify **key stakeholders**  
-- Identify **main use cases**  
-
-### Phase 2: Narrative Design
-- Propose **story arcs** for communicating the feature  
-- Suggest **emotional beats and transitions**  
-- Plan **visual and audio synchronization ideas** for presentations or videos  
-
-### Input:
-{description}
-
-### Output (strict JSON only, no extra text):
-{{
-  "concept_analysis": {{
-    "core_value_propositions": [],
-    "pain_points": [],
-    "stakeholders": [],
-    "use_cases": []
-  }},
-  "narrative_design": {{
-    "story_arcs": [],
-    "emotional_beats": [],
-    "visual_audio_sync": []
-  }}
-}}
-      `,
-    });
+    const cacheKey = contentKey("analyze", description);
+    const cachedResult = agentCacheGet(cacheKey);
+    if (cachedResult) {
+      return cachedResult;
+    }
 
-    const prompt = await template.format({ description });
-    const model = this.getModel();
+    const prompt = await ANALYZE_PROMPT.format({ description });
+    const model = this.getJsonModel();
     const rawOutput = await model.invoke(prompt);
 
-    const cleaned = this.cleanText(rawOutput.content?.toString() || "");
-
-    try {
-      return JSON.parse(cleaned);
-    } catch (err) {
-      return { raw_output: cleaned, error: "Failed to parse JSON" };
+    const rawText = messageText(rawOutput.content);
+    const parsed = this.parseJsonResponse(rawText);
+    if (parsed === null) {
+      return { raw_output: rawText, error: "Failed to parse JSON" };
     }
+
+    agentCacheSet(cacheKey, parsed);
+    return parsed;
   }
 
   /** Tech Layer Agent */
   public async generateTechLayer(feature_analysis: any, user_prompt: string) {
-    const template = new PromptTemplate({
-      inputVariables: ["user_prompt", "feature_analysis"],
-      template: `Act like an AI Video Story Architect. You will be given  inputs: 
-1. A user request for generating cinematic video output. 
-
-Your task is to generate exactly 8 cinematic video chunks, each lasting 8 seconds, forming a continuous story with a linear screenplay. Follow these strict requirements:
-
-1. Characters:
-   - Do not create global or disconnected characters. 
-   - Follow the SAME main characters consistently across all 8 chunks. 
-   - Characters must evolve through the storyline with emotional depth, authenticity, and continuity in appearance, voice, gestures, and personality. 
-   - Ensure character resemblance and consistency across all scenes.
-
-2. Storytelling:
-   - Build a continuous narrative arc across 8 chunks with a beginning, development, climax, and resolution. 
-   - Each chunk should feel self-contained but clearly connect to the next.
-   - Ensure emotional progression (hope, struggle, tension, release, resolution).
-
-3. Scene & Activity Design:
-   - Focus on authentic human activities (e.g., working, traveling, cooking, playing, repairing, discovering). 
-   - No talking heads. 
-   - No text overlays.
-   - Use realistic interactions, props, and environmental storytelling.
-   - Anchor each scene in grounded human experiences rather than abstract visuals.
-
-4. Technical & Cinematic Layer (VEO3 Optimization):
-   - Optimize lighting to stay consistent across all 8 chunks. 
-   - Ensure audio overlays (ambient sounds, natural dialogues, music cues) match scene transitions smoothly. 
-   - Keep camera movement cinematic: varied shots (wide, close-up, tracking) for immersive storytelling. 
-   - Ensure visual continuity (clothing, props, weather, and setting consistency).
-   - Apply cinematic pacing: balance quiet emotional beats with dynamic sequences.
-
-5. Output Structure:
-   - Provide the output as a structured screenplay divided into 8 clearly marked chunks (Chunk 1 to Chunk 8).
-   - For each chunk, specify: 
-     a) Scene setting (location, time of day, mood, lighting). 
-     b) Characters present and their actions. 
-     c) Emotional tone and progression. 
-     d) Suggested camera angles and movement. 
-     e) Audio/ambient sound cues. 
-     f) Continuity notes to ensure seamless flow into the next chunk.
-
-6. Goal:
-   - Create a single cinematic narrative optimized for VEO3 generation where characters remain consistent across all chunks.
-   - The final product should feel like an 8-part short film series with cinematic cohesion.
-
-Take a deep breath and work on this problem step-by-step.
-
-
-Output Rules:  
-- Return **ONLY JSON**, nothing else  
-- JSON format must be:  
-
-{{
-  "chunk1": {{"heading": "", "environment": "", "characters": [], "activity": "", "camera_direction": "", "audio_visual_sync": "" }},
-  "chunk2": {{ "heading": "", "environment": "", "characters": [], "activity": "", "camera_direction": "", "audio_visual_sync": "" }},
-  ...
-  "chunk8": {{ "heading": "", "environment": "", "characters": [], "activity": "", "camera_direction": "", "audio_visual_sync": "" }}
-}}
-
-### Inputs:
-- User Prompt: {user_prompt}
-`,
-    });
+    // feature_analysis is kept in the signature for compatibility but is
+    // not interpolated into the prompt — the template only needs the raw
+    // user prompt, so the cache is keyed on that alone.
+    const cacheKey = contentKey("tech_layer", user_prompt);
+    const cachedResult = agentCacheGet(cacheKey);
+    if (cachedResult) {
+      return cachedResult;
+    }
 
-    const prompt = await template.format({
+    const prompt = await TECH_LAYER_PROMPT.format({
       user_prompt: user_prompt,
-      feature_analysis: feature_analysis,
     });
 
-    const model = this.getModel();
+    const model = this.getJsonModel();
     const rawOutput = await model.invoke(prompt);
 
-    const cleaned = this.cleanText(rawOutput.content?.toString() || "");
-
-    try {
-      return JSON.parse(cleaned);
-    } catch (err) {
-      return { raw_output: cleaned, error: "Failed to parse JSON" };
+    const rawText = messageText(rawOutput.content);
+    const parsed = this.parseJsonResponse(rawText);
+    if (parsed === null) {
+      return { raw_output: rawText, error: "Failed to parse JSON" };
     }
+
+    agentCacheSet(cacheKey, parsed);
+    return parsed;
   }
 
-  public async generateScreenplay(chunks: any, screenplayType: string) {
-    const template = new PromptTemplate({
-      inputVariables: ["chunks", "screenplayType"],
-      template: `
-      Act like a professional screenplay writer and cinematic scene designer. 
-You will be given an AI-generated structured output divided into 8 chunks (chunk1 to chunk8). 
-Each chunk contains details such as heading, environment, characters, activity, camera direction, and audio/visual sync. 
-
-Your task is to transform these 8 chunks into a screenplay formatted as 8 scenes (Scene 1 to Scene 8). 
-
-Instructions:
-1. For each chunk, create a corresponding scene (Scene 1 through Scene 8). 
-2. Rewrite in cinematic screenplay style with immersive detail, while preserving the information given in each chunk. 
-   - Scene heading (location + time + mood). 
-   - Environment description in rich cinematic detail. 
-   - Character presence and actions in natural screenplay narrative. 
-   - Emotional tone that matches the progression across scenes. 
-   - Camera direction written in film language (establishing shots, pans, close-ups, tracking shots, crane shots). 
-   - Audio/visual sync integrated naturally into scene descriptions (ambient sounds, music cues, emotional resonance). 
-   - Continuity notes embedded as subtle cues (e.g., clothing, props, emotional carryover). 
-3. Ensure seamless narrative flow across all 8 scenes, maintaining character continuity and emotional arcs. 
-4. Do not summarize — expand each chunk into a fully written cinematic scene description. 
-5. Use the same characters and environment across all scenes.
-6. Mention the charecter details like who all are present what is their dress colurm and skin tone in each scene.
-7. Use same colur of attire  and skin tonefor a charecter across all scenes.
-8. Use same hair style and color for a charecter across all scenes.
-9. Use same facial features and expressions for a charecter across all scenes.
-10. Use same body type and height for a charecter across all scenes.
-11. Use same voice and speech patterns for a charecter across all scenes.
-12. Use same personality and behavior for a charecter across all scenes.
-Goal: Deliver a cinematic screenplay where each scene corresponds to one chunk, making the story ready for VEO3 video generation. 
-
-Take a deep breath and work on this problem step-by-step.
-
-Output Rules:  
-- Return **ONLY JSON**, nothing else  
-- JSON format must be:  
-
-json format:
- {{
-    {{"scene_number": 1, "content": "..."}},
-    {{"scene_number": 2, "content": "..."}},
-    {{"scene_number": 8, "content": "..."}}
-}}
+  /**
+   * Fused Feature-Analysis + Tech-Layer agent: one Gemini call producing
+   * both results. Returns null when the response can't be parsed into both
+   * halves, so callers can fall back to the split agents.
+   */
+  private async analyzeAndGenerate(description: string): Promise<{
+    featureAnalysis: any;
+    techLayer: any;
+  } | null> {
+    const cacheKey = contentKey("analyze_and_tech", description);
+    const cachedResult = agentCacheGet(cacheKey);
+    if (cachedResult) {
+      return cachedResult;
+    }
 
+    const prompt = await ANALYZE_AND_TECH_PROMPT.format({ description });
+    const model = this.getJsonModel();
+    const rawOutput = await model.invoke(prompt);
 
+    const parsed = this.parseJsonResponse(messageText(rawOutput.content));
+    if (!parsed || !parsed.feature_analysis || !parsed.tech_layer) {
+      return null;
+    }
 
-### User Input:
-{chunks}
-      `,
-    });
+    const result = {
+      featureAnalysis: parsed.feature_analysis,
+      techLayer: parsed.tech_layer,
+    };
+    agentCacheSet(cacheKey, result);
+    return result;
+  }
 
-    const prompt = await template.format({ chunks, screenplayType });
-    const model = this.getModel();
+  public async generateScreenplay(chunks: any, screenplayType: string) {
+    // Serialize the chunks once, compactly: template interpolation would
+    // otherwise stringify the object via toString ("[object Object]"), and
+    // indented JSON only adds whitespace tokens to the prompt.
+    const chunksText =
+      typeof chunks === "string" ? chunks : JSON.stringify(chunks);
+    const prompt = await SCREENPLAY_PROMPT.format({ chunks: chunksText });
+    const model = this.getJsonModel();
     const rawOutput = await model.invoke(prompt);
 
-    const cleaned = this.cleanText(rawOutput.content?.toString() || "");
+    const rawText = messageText(rawOutput.content);
+    const parsed = this.parseJsonResponse(rawText);
+    if (parsed !== null) {
+      return parsed;
+    }
 
+    // Last resort: rebuild a minimal scenes structure from the raw text
+    console.error("Failed to parse screenplay JSON; attempting reconstruction");
     try {
-      return JSON.parse(cleaned);
+      return JSON.parse(this.reconstructJSON(this.cleanText(rawText)));
     } catch (err) {
-      console.error("JSON parsing error:", err);
-      console.error("Failed to parse cleaned text:", cleaned);
-
-      // Try to fix the JSON and parse again
-      const fixed = this.tryFixJSON(cleaned);
-
-      try {
-        return JSON.parse(fixed);
-      } catch (secondErr) {
-        console.error("Second JSON parsing attempt failed:", secondErr);
-
-        // Third attempt: Try to reconstruct the JSON structure
-        try {
-          const reconstructed = this.reconstructJSON(cleaned);
-          return JSON.parse(reconstructed);
-        } catch (thirdErr) {
-          console.error(
-            "Third JSON parsing attempt (reconstruction) failed:",
-            thirdErr
-          );
-
-          // Try to provide a more helpful error message
-          if (err instanceof SyntaxError) {
-            return {
-              raw_output: cleaned,
-              error: "Failed to parse JSON after all cleanup attempts",
-              details: err.message,
-              position: err.message.match(/position (\d+)/)?.[1] || "unknown",
-              fixed_attempt: fixed,
-            };
-          }
-
-          return {
-            raw_output: cleaned,
-            error: "Failed to parse JSON after all cleanup attempts",
-            details: err,
-          };
-        }
-      }
+      console.error("Screenplay JSON reconstruction failed:", err);
+      return {
+        raw_output: rawText,
+        error: "Failed to parse JSON after all cleanup attempts",
+      };
     }
   }
 
-  public async generatePreviousResponse(sessionId: string, userInput: string) {
+  /** Build LangChain messages from stored history plus the new user input */
+  private async buildConversationContents(
+    sessionId: string,
+    userInput: string
+  ) {
     const chatHistory = await ChatSession.findOne({ sessionId });
     if (!chatHistory) {
-      return { error: "Chat history not found" };
+      return null;
     }
 
     // Convert your DB messages into LangChain-compatible messages
@@ -491,23 +643,138 @@ json format:
     });
 
     // Add the current user input
-    const contents = [...historyContents, new HumanMessage(userInput)];
+    return [...historyContents, new HumanMessage(userInput)];
+  }
+
+  public async generatePreviousResponse(sessionId: string, userInput: string) {
+    const contents = await this.buildConversationContents(
+      sessionId,
+      userInput
+    );
+    if (!contents) {
+      return { error: "Chat history not found" };
+    }
 
     const model = this.getModel();
     const rawOutput = await model.invoke(contents);
 
-    const cleaned = this.cleanText(rawOutput.content?.toString() || "");
+    const cleaned = this.cleanText(messageText(rawOutput.content));
     return cleaned;
   }
 
+  /**
+   * Stream a conversational reply token-by-token. Total generation time is
+   * unchanged, but callers can flush chunks to the client as they arrive,
+   * so perceived latency drops to the model's time-to-first-token.
+   */
+  public async *streamConversation(sessionId: string, userInput: string) {
+    const contents =
+      (await this.buildConversationContents(sessionId, userInput)) ??
+      // New sessions have no stored history yet; stream from the input alone
+      [new HumanMessage(userInput)];
+
+    const model = this.getModel();
+    const stream = await model.stream(contents);
+    for await (const chunk of stream) {
+      const piece = messageText(chunk.content);
+      if (piece) {
+        yield piece;
+      }
+    }
+  }
+
+  /** Retry a call with exponential backoff on rate-limit/unavailable errors */
+  private async withRetry<T>(
+    func: () => Promise<T>,
+    retries = 3,
+    delay = 1000
+  ): Promise<T> {
+    for (let attempt = 0; ; attempt++) {
+      try {
+        return await func();
+      } catch (error: any) {
+        const status = error?.status ?? error?.response?.status;
+        if ((status === 429 || status === 503) && attempt < retries - 1) {
+          this.logger.warn(
+            `Gemini returned ${status}; retrying in ${delay}ms...`
+          );
+          await new Promise((resolve) => setTimeout(resolve, delay));
+          delay *= 2;
+        } else {
+          throw error;
+        }
+      }
+    }
+  }
+
+  /**
+   * Process several user inputs concurrently through a bounded worker pool.
+   * Gemini calls are I/O-bound, so a small degree of concurrency multiplies
+   * throughput without tripping per-minute rate limits; transient 429/503
+   * responses are retried with exponential backoff. Results come back in
+   * input order and individual failures don't abort the batch.
+   */
+  public async processBatch(
+    inputs: string[],
+    sessionId: string,
+    screenplayType: string,
+    concurrency = 4
+  ) {
+    const results: any[] = new Array(inputs.length);
+    let next = 0;
+
+    const worker = async () => {
+      while (next < inputs.length) {
+        const index = next++;
+        const input = inputs[index]!;
+        try {
+          results[index] = await this.withRetry(() =>
+            this.processUserInput(input, sessionId, screenplayType)
+          );
+        } catch (error) {
+          results[index] = {
+            error: "Processing failed after retries",
+            details: error instanceof Error ? error.message : error,
+          };
+        }
+      }
+    };
+
+    const workerCount = Math.max(1, Math.min(concurrency, inputs.length));
+    await Promise.all(Array.from({ length: workerCount }, () => worker()));
+
+    return results;
+  }
+
   /** Main workflow */
   public async processUserInput(
     userInput: string,
     sessionId: string,
     screenplayType: string
   ) {
-    // Step 1: Classification
-    const classificationResult = await this.classifyInput(userInput);
+    // Step 0: resolve trivially classifiable inputs up front so greetings
+    // never pay for the speculative analysis call (or even a prompt build).
+    const fastLabel = fastClassify(userInput);
+
+    // Step 1: Classification, with a speculative fused
+    // analysis-plus-tech-layer call already in flight. Both are I/O-bound
+    // Gemini round-trips, so overlapping them cuts the feature path's
+    // wall-clock latency from the sum of the calls toward the slowest one.
+    let speculativeFused: Promise<{
+      featureAnalysis: any;
+      techLayer: any;
+    } | null> | null = null;
+    if (fastLabel !== "General Conversation") {
+      speculativeFused = this.analyzeAndGenerate(userInput);
+      // If classification picks the conversation branch the speculative
+      // result is discarded; swallow its rejection so it can't surface as
+      // an unhandled promise rejection.
+      speculativeFused.catch(() => {});
+    }
+
+    const classificationResult = fastLabel
+      ? { classification: fastLabel }
+      : await this.classifyInput(userInput);
     const classification = classificationResult.classification || "";
 
     if (classification === "General Conversation") {
@@ -521,23 +788,35 @@ json format:
         result: response,
       };
     } else if (classification === "Feature Description") {
-      const featureAnalysis = await this.analyzeFeature(userInput);
-      if ("error" in featureAnalysis) {
-        return {
-          error: "Feature analysis failed try again after some time",
-          details: featureAnalysis,
-        };
-      }
+      const fused = await (speculativeFused ??
+        this.analyzeAndGenerate(userInput));
+
+      let featureAnalysis: any;
+      let techLayer: any;
+      if (fused) {
+        ({ featureAnalysis, techLayer } = fused);
+      } else {
+        // Fused response couldn't be parsed — fall back to the split
+        // agents, still overlapped (the tech-layer prompt only consumes
+        // the raw user prompt, not the analysis JSON).
+        const techLayerPromise = this.generateTechLayer(null, userInput);
+        techLayerPromise.catch(() => {});
+
+        featureAnalysis = await this.analyzeFeature(userInput);
+        if ("error" in featureAnalysis) {
+          return {
+            error: "Feature analysis failed try again after some time",
+            details: featureAnalysis,
+          };
+        }
 
-      const techLayer = await this.generateTechLayer(
-        featureAnalysis,
-        userInput
-      );
-      if ("error" in techLayer) {
-        return {
-          error: "Tech layer failed try again after some time",
-          details: techLayer,
-        };
+        techLayer = await techLayerPromise;
+        if ("error" in techLayer) {
+          return {
+            error: "Tech layer failed try again after some time",
+            details: techLayer,
+          };
+        }
       }
       const screenplay = await this.generateScreenplay(
         techLayer,
@@ -1,6 +1,8 @@
 import { Router } from "express";
 import {
+  chatBatch,
   chatMessage,
+  chatMessageStream,
   getMessages,
   getSessionsByEmail,
 } from "../controllers/chatController";
@@ -9,6 +11,8 @@ import { jwtAuth } from "../middleware/jwtAuth";
 const router = Router();
 
 router.post("/message", jwtAuth, chatMessage);
+router.post("/message/batch", jwtAuth, chatBatch);
+router.post("/message/stream", jwtAuth, chatMessageStream);
 router.get("/session/:sessionId", jwtAuth, getMessages);
 router.get("/sessions/:email", jwtAuth, getSessionsByEmail);
 